@@ -1,20 +1,55 @@
+import asyncio as aio
+from collections.abc import Coroutine, Sequence
+from contextlib import suppress
+
 import rich_click as click
 from pydanclick import from_pydantic
 
 from .config import Config, set_global_config
 from .watchers import watch_new_runs
-from .logging import LOGGER
+from .logging import LOGGER, set_log_format
+
+
+class AsyncCommand(click.RichCommand):
+    """
+    A command whose callback returns a coroutine.
+    From the command line the coroutine runs to completion on a new event loop,
+    while start() schedules it on an already running loop instead.
+    """
 
+    def invoke(self, ctx: click.Context) -> None:
+        with suppress(KeyboardInterrupt):
+            aio.run(super().invoke(ctx))
 
-@click.command(context_settings={"show_default": True})
+    def start(self, args: Sequence[str]) -> aio.Task:
+        """
+        Parses the arguments like the command line does and starts the command on the running event loop.
+
+        Args:
+            args (Sequence[str]): The command line arguments, without the program name.
+
+        Returns:
+            aio.Task: The running command, cancel it to stop.
+        """
+        with self.make_context(self.name, list(args)) as ctx:
+            return aio.create_task(super().invoke(ctx))
+
+
+@click.command(cls=AsyncCommand, context_settings={"show_default": True})
 @click.option(
     "--log-level",
     default="INFO",
     type=click.Choice(["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"], case_sensitive=False),
     help="Set the logging level for the application."
 )
+@click.option(
+    "--log-format",
+    default="text",
+    type=click.Choice(["text", "json"], case_sensitive=False),
+    help="Log human readable lines, or one JSON object per line."
+)
 @from_pydantic(Config)
-def main(config: Config, log_level: str) -> None:
+def main(config: Config, log_level: str, log_format: str) -> Coroutine:
     """
     Starts the nanopore sync application using the provided configuration.
     Sets up global configuration and begins watching for new sequencing runs.
@@ -23,8 +58,22 @@ def main(config: Config, log_level: str) -> None:
         config (Config): The configuration object for the application.
 
     Returns:
-        None
+        Coroutine: Watches for new runs until cancelled.
     """
     set_global_config(config)
     LOGGER.setLevel(log_level)
-    watch_new_runs()
+    set_log_format(log_format)
+    return watch_new_runs()
+
+
+def run(argv: Sequence[str]) -> aio.Task:
+    """
+    Starts the application in-process on the running event loop, e.g. from tests.
+
+    Args:
+        argv (Sequence[str]): The command line arguments, without the program name.
+
+    Returns:
+        aio.Task: The task watching for new runs, cancel it to stop.
+    """
+    return main.start(argv)
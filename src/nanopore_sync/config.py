@@ -3,15 +3,31 @@
 from pydantic import BaseModel, Field, DirectoryPath
 from typing import Literal
 
+from dataclasses import dataclass
 from pathlib import Path
+import re
 
 
-class CONFIG:
+@dataclass(slots=True, init=False)
+class GlobalConfig:
+    """
+    Plain, slotted holder for the settings read on every event, filled in by set_global_config.
+    Unlike Config it does no validation, so attribute access stays cheap.
+    """
+
     source: Path
     destination: Path
     run_name_pattern: str
     completion_signal_pattern: str
     verify: bool
+    max_parallel_syncs: int
+    copy_method: str
+    run_path_re: re.Pattern[str]
+    completion_signal_re: re.Pattern[str]
+
+
+# A single instance that is updated in place, so modules can keep doing `from .config import CONFIG`.
+CONFIG = GlobalConfig()
 
 
 class Config(BaseModel):
@@ -25,6 +41,8 @@ class Config(BaseModel):
         run_name_pattern (str): Regex pattern to match nanopore run names.
         completion_signal_pattern (str): Regex pattern to match the completion signal file.
         verify (bool): Checks the total directory size after copy.
+        max_parallel_syncs (int): Maximum number of runs to sync at the same time.
+        copy_method (str): How to copy runs: rsync, cp, a threaded copy in Python, or auto to pick one.
     """
     class Config:
         validate_assignment = True
@@ -52,12 +70,22 @@ class Config(BaseModel):
         True,
         description="Checks the total directory size after copy",
     )
+    max_parallel_syncs: int = Field(
+        1,
+        ge=1,
+        description="Maximum number of runs to sync at the same time",
+    )
+    copy_method: Literal["auto", "rsync", "cp", "python"] = Field(
+        "auto",
+        description="How to copy runs: rsync, cp or a threaded copy in Python; auto picks rsync, then cp",
+    )
 
 
 def set_global_config(config: "Config"):
     """
     Updates the global configuration object with values from the provided Config instance.
-    Copies all relevant configuration fields to the global CONFIG object for use throughout the application.
+    Copies all relevant configuration fields to the global CONFIG object for use throughout the application,
+    and compiles the regex patterns once so that event handlers don't have to.
 
     Args:
         config (Config): The configuration object containing new settings.
@@ -65,9 +93,13 @@ def set_global_config(config: "Config"):
     Returns:
         None
     """
-    global CONFIG
     CONFIG.source = config.source
     CONFIG.destination = config.destination
     CONFIG.run_name_pattern = config.run_name_pattern
     CONFIG.completion_signal_pattern = config.completion_signal_pattern
     CONFIG.verify = config.verify
+    CONFIG.max_parallel_syncs = config.max_parallel_syncs
+    CONFIG.copy_method = config.copy_method
+    # Matched case-insensitively against full paths, like watchdog does with plain string regexes.
+    CONFIG.run_path_re = re.compile(f".*/{config.run_name_pattern}$", re.IGNORECASE)
+    CONFIG.completion_signal_re = re.compile(config.completion_signal_pattern)
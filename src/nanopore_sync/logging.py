@@ -1,10 +1,57 @@
 """
 Configures and provides a logger for the nanopore sync application.
 Sets up logging with a standard format and exposes a module-level LOGGER object.
+Log calls for notable steps pass `event`, `run` and `path` fields as `extra`, which the JSON format includes.
 """
 
+import json
 import logging
 
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+TEXT_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+
+# The handler the application logs through when run from the command line, the only one set_log_format changes.
+# basicConfig leaves it unattached when the root logger is already configured, e.g. when running under pytest.
+HANDLER = logging.StreamHandler()
+logging.basicConfig(level=logging.INFO, format=TEXT_FORMAT, handlers=[HANDLER])
 
 LOGGER = logging.getLogger(__name__)
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats each log record as a single line of JSON, including any structured fields passed as `extra`.
+    """
+
+    fields = ("event", "run", "path")
+
+    def to_dict(self, record: logging.LogRecord) -> dict:
+        """
+        Collects the fields of a log record that make up its JSON object.
+
+        Args:
+            record (logging.LogRecord): The record to convert.
+
+        Returns:
+            dict: The time, level and message of the record, its structured fields as strings and any exception.
+        """
+        entry = {"time": self.formatTime(record), "level": record.levelname, "message": record.getMessage()}
+        entry.update({field: str(getattr(record, field)) for field in self.fields if hasattr(record, field)})
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return entry
+
+    def format(self, record: logging.LogRecord) -> str:
+        return json.dumps(self.to_dict(record))
+
+
+def set_log_format(log_format: str) -> None:
+    """
+    Switches the format of the application's log output, leaving any other handlers on the root logger alone.
+
+    Args:
+        log_format (str): Either "text" for human readable lines or "json" for one JSON object per line.
+
+    Returns:
+        None
+    """
+    HANDLER.setFormatter(JsonFormatter() if log_format.lower() == "json" else logging.Formatter(TEXT_FORMAT))
@@ -1,54 +1,372 @@
-from pathlib import Path
-from subprocess import run, CalledProcessError
+from concurrent.futures import ThreadPoolExecutor
+import errno
+from functools import cache
+import os
+import re
+from shutil import copyfileobj, which
+from subprocess import PIPE, run, CalledProcessError
 
 from .config import CONFIG
 from .logging import LOGGER
 
+# rsync exit codes that are worth telling apart from a generic failure.
+RSYNC_PARTIAL_TRANSFER = 23
+RSYNC_VANISHED_SOURCE = 24
+# rsync releases before 3.1.3 refuse to combine --sparse with --inplace.
+RSYNC_MIN_VERSION = (3, 1, 3)
 
-def _dir_size(path: Path) -> int:
+# Bytes handed to a single copy_file_range call, and the buffer used when the kernel can't copy for us.
+COPY_CHUNK_SIZE = 1 << 30
+FALLBACK_BUFFER_SIZE = 4 << 20
+# copy_file_range errors that mean the kernel can't copy these files for us, rather than that copying failed.
+# Besides the documented ones, some FUSE and NFS setups return EINVAL, and seccomp profiles of containers EPERM.
+COPY_FALLBACK_ERRNOS = frozenset(
+    (errno.EXDEV, errno.ENOSYS, errno.EOPNOTSUPP, errno.EINVAL, errno.EPERM, errno.EBADF, errno.ETXTBSY)
+)
+
+# Files below SMALL_FILE_SIZE are copied in a single read,
+# and files below LARGE_FILE_SIZE through a MEDIUM_BUFFER_SIZE buffer.
+SMALL_FILE_SIZE = 64 << 10
+LARGE_FILE_SIZE = 16 << 20
+MEDIUM_BUFFER_SIZE = 1 << 20
+
+# Checked once; only Linux is supported, but not every Python build there exposes posix_fadvise.
+HAS_POSIX_FADVISE = hasattr(os, "posix_fadvise")
+
+# Threads used to copy files concurrently when falling back to copying in Python.
+COPY_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+
+def _dir_stats(path: str) -> tuple[int, int]:
+    """
+    Counts the files within a directory and its subdirectories and sums up their sizes.
+    Symlinks are neither followed nor counted.
+
+    Args:
+        path (str): The root directory to measure.
+
+    Returns:
+        tuple[int, int]: The number of files and their total size in bytes.
+    """
+    # os.scandir hands back the file type from readdir, so each file costs a single stat call.
+    files, size, stack = 0, 0, [path]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    files += 1
+                    size += entry.stat(follow_symlinks=False).st_size
+    return files, size
+
+
+def _fadvise(fd: int, advice: int) -> None:
+    """
+    Gives the kernel a hint about how a whole file will be accessed, where posix_fadvise(2) is available.
+
+    Args:
+        fd (int): The file descriptor the advice applies to.
+        advice (int): One of the os.POSIX_FADV_* constants.
+
+    Returns:
+        None
+    """
+    if HAS_POSIX_FADVISE:
+        os.posix_fadvise(fd, 0, 0, advice)
+
+
+def _fast_copy(src: str, dst: str, *, follow_symlinks: bool = True) -> None:
+    """
+    Copies the contents of a single file, letting the kernel move the data with copy_file_range(2).
+    Falls back to a buffered userspace copy when the kernel or filesystem does not support it.
+
+    Args:
+        src (str): The file to copy.
+        dst (str): The path of the copy.
+        follow_symlinks (bool): Accepted for compatibility with shutil copy functions.
+
+    Returns:
+        None
+    """
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        _fadvise(fsrc.fileno(), os.POSIX_FADV_SEQUENTIAL)
+        try:
+            while os.copy_file_range(fsrc.fileno(), fdst.fileno(), COPY_CHUNK_SIZE):
+                pass
+        except OSError as exc:
+            if exc.errno not in COPY_FALLBACK_ERRNOS:
+                raise
+            # Both file offsets have advanced by whatever the kernel managed to copy, so just carry on from there.
+            copyfileobj(fsrc, fdst, FALLBACK_BUFFER_SIZE)
+        # The source won't be read again, so don't let it push everything else out of the page cache.
+        # The copy is left alone: its pages are still dirty, so advice would only take effect after waiting for a sync.
+        _fadvise(fsrc.fileno(), os.POSIX_FADV_DONTNEED)
+
+
+def _copy_sparse(src: str, dst: str, size: int) -> None:
     """
-    Computes the total size in bytes of all files within a directory and its subdirectories.
-    Returns the sum of the sizes of all files found under the given path.
+    Copies a sparse file, copying only its data regions and leaving its holes as holes in the copy.
+    Data regions are found with SEEK_DATA/SEEK_HOLE and copied in the kernel where possible.
 
     Args:
-        path (Path): The root directory whose file sizes will be summed.
+        src (str): The file to copy.
+        dst (str): The path of the copy.
+        size (int): The size of the source file in bytes.
 
     Returns:
-        int: The total size in bytes of all files in the directory.
+        None
+    """
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        fin, fout = fsrc.fileno(), fdst.fileno()
+        # Sizing the copy up front keeps a trailing hole, which is never visited below.
+        os.ftruncate(fout, size)
+        offset = 0
+        while offset < size:
+            try:
+                start = os.lseek(fin, offset, os.SEEK_DATA)
+            except OSError as exc:
+                if exc.errno == errno.ENXIO:
+                    break  # Nothing but a hole left.
+                raise
+            end = os.lseek(fin, start, os.SEEK_HOLE)
+            while start < end:
+                try:
+                    copied = os.copy_file_range(fin, fout, end - start, start, start)
+                except OSError as exc:
+                    if exc.errno not in COPY_FALLBACK_ERRNOS:
+                        raise
+                    copied = os.pwrite(fout, os.pread(fin, min(end - start, FALLBACK_BUFFER_SIZE), start), start)
+                if not copied:
+                    return  # The source was truncated while being copied.
+                start += copied
+            offset = end
+
+
+def _copy_file(src: str, dst: str, stat: os.stat_result) -> None:
     """
-    return sum(f.stat().st_size for f in path.glob("**/*") if f.is_file())
+    Copies a single file using the strategy best suited to its size and layout.
+    Sparse files only have their data regions copied, small files take a single read and write,
+    medium files a buffered copy, and large files are copied in the kernel by _fast_copy.
 
+    Args:
+        src (str): The file to copy.
+        dst (str): The path of the copy.
+        stat (os.stat_result): The stat result of the source file.
 
-def sync_run(source: Path) -> None:
+    Returns:
+        None
+    """
+    # Fewer allocated 512-byte blocks than the size needs means the file has holes.
+    if stat.st_blocks * 512 < stat.st_size:
+        _copy_sparse(src, dst, stat.st_size)
+        return
+    if stat.st_size >= LARGE_FILE_SIZE:
+        _fast_copy(src, dst)
+        return
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        if stat.st_size < SMALL_FILE_SIZE:
+            fdst.write(fsrc.read())
+        else:
+            copyfileobj(fsrc, fdst, MEDIUM_BUFFER_SIZE)
+
+
+def _parallel_copytree(source: str, destination: str) -> tuple[int, int]:
+    """
+    Copies a directory tree in Python using a pool of threads, without copying any file metadata.
+    Directories are created up front in a single walk, after which the files are copied concurrently
+    to overlap the per-file syscall latency that dominates runs with many small files.
+
+    Args:
+        source (str): The directory to copy.
+        destination (str): The path of the copy, which must not exist yet.
+
+    Returns:
+        tuple[int, int]: The number of files copied and their total size in bytes, as seen during the walk.
+    """
+    jobs, size, stack = [], 0, [(source, destination)]
+    while stack:
+        src_dir, dst_dir = stack.pop()
+        os.makedirs(dst_dir)
+        with os.scandir(src_dir) as entries:
+            for entry in entries:
+                target = os.path.join(dst_dir, entry.name)
+                if entry.is_symlink():
+                    os.symlink(os.readlink(entry.path), target)
+                elif entry.is_dir():
+                    stack.append((entry.path, target))
+                elif entry.is_file():
+                    jobs.append((entry.path, target, stat := entry.stat()))
+                    size += stat.st_size
+
+    with ThreadPoolExecutor(max_workers=COPY_WORKERS) as executor:
+        # Consume the results so that the first failed copy is raised here.
+        for _ in executor.map(lambda job: _copy_file(*job), jobs):
+            pass
+    return len(jobs), size
+
+
+def _parse_rsync_stats(stats: str) -> tuple[int, int] | None:
+    """
+    Reads the number of regular files and their total size from the statistics rsync prints with --info=stats2,
+    so they can stand in for walking the source again with _dir_stats.
+
+    Args:
+        stats (str): The output of rsync.
+
+    Returns:
+        tuple[int, int] | None: The number of files and their total size in bytes,
+            or None if the statistics are missing or can't be compared with _dir_stats.
+    """
+    files = re.search(r"^Number of files: [\d,.]+ \(([^)]*)\)", stats, re.MULTILINE)
+    size = re.search(r"^Total file size: ([\d,.]+) bytes", stats, re.MULTILINE)
+    if files is None or size is None:
+        return None
+    # E.g. "reg: 3, dir: 2, link: 1", where types without any files are left out, with thousands separators.
+    counts = {kind: int(re.sub(r"\D", "", count)) for kind, count in re.findall(r"(\w+): ([\d,.]+)", files.group(1))}
+    # rsync's total size includes the length of each symlink, which _dir_stats doesn't count.
+    if counts.get("link"):
+        return None
+    return counts.get("reg", 0), int(re.sub(r"\D", "", size.group(1)))
+
+
+@cache
+def _rsync_supported() -> bool:
+    """
+    Checks once whether rsync is installed and recent enough for the options _copy_tree runs it with.
+
+    Returns:
+        bool: True if rsync can be used, False if runs should be copied some other way.
+    """
+    if not which("rsync"):
+        return False
+    try:
+        proc = run(["rsync", "--version"], check=True, stdout=PIPE, text=True)
+    except (OSError, CalledProcessError):
+        return False
+    match = re.search(r"version (\d+)\.(\d+)\.(\d+)", proc.stdout)
+    if match is None or tuple(map(int, match.groups())) < RSYNC_MIN_VERSION:
+        LOGGER.warning(
+            "rsync %s is older than %s, runs will be copied without it.",
+            match.group(0).removeprefix("version ") if match else "of unknown version",
+            ".".join(map(str, RSYNC_MIN_VERSION)),
+        )
+        return False
+    return True
+
+
+def _copy_tree(source: str, destination: str) -> tuple[int, int] | None:
+    """
+    Copies a directory tree with the configured copy method.
+    For "auto" that is rsync if it is recent enough, then cp, and finally the copy in Python if neither is installed.
+    rsync skips holes in sparse files and writes each file in place rather than through a temporary copy,
+    cp can reflink files when the destination lives on the same copy-on-write filesystem,
+    and the copy in Python copies many files at once, which pays off for runs with many small files.
+
+    Args:
+        source (str): The directory to copy.
+        destination (str): The path of the copy, which must not exist yet.
+
+    Returns:
+        tuple[int, int] | None: The number of files and bytes in the source, if they were counted while copying.
+
+    Raises:
+        CalledProcessError: If the copy command exits with a non-zero status.
+    """
+    if (method := CONFIG.copy_method) == "auto":
+        method = "rsync" if _rsync_supported() else "cp" if which("cp") else "python"
+    # NOTE: shutil.copytree is not used here because it invokes shutil.copystat at the end,
+    # which can cause issues with file permissions and timestamps on some systems.
+    # For the same reason rsync and cp are run without -a, which would preserve permissions, times and ownership.
+    if method == "rsync":
+        proc = run(
+            ["rsync", "-rlHS", "--inplace", "--info=stats2", f"{source}/", f"{destination}/"],
+            check=True,
+            stdout=PIPE,
+            text=True,
+        )
+        LOGGER.debug("rsync stats for '%s':\n%s", source, proc.stdout)
+        return _parse_rsync_stats(proc.stdout)
+    elif method == "cp":
+        run(["cp", "-r", "--reflink=auto", source, destination], check=True)
+        return None
+    else:
+        return _parallel_copytree(source, destination)
+
+
+def sync_run(source: str) -> None:
     """
     Synchronizes a sequencing run directory from the source to the configured destination.
     Handles copying, existence checks, error logging, and optional size verification.
 
     Args:
-        source (Path): The path to the source run directory.
+        source (str): The path to the source run directory.
 
     Returns:
         None
     """
-    destination = CONFIG.destination / source.name
-    if not destination.parent.is_dir():
-        LOGGER.error(f"Destination directory '{destination.parent}' does not exist.")
+    name = os.path.basename(source.rstrip("/"))
+    destination = os.path.join(CONFIG.destination, name)
+    if not os.path.isdir(CONFIG.destination):
+        LOGGER.error(
+            "Destination directory '%s' does not exist.",
+            CONFIG.destination,
+            extra={"event": "destination_missing", "run": name, "path": CONFIG.destination},
+        )
         return
-    elif destination.exists():
-        LOGGER.warning(f"Run '{source.name}' already exists in '{destination}'.")
+    elif os.path.exists(destination):
+        LOGGER.warning(
+            "Run '%s' already exists in '%s'.",
+            name,
+            destination,
+            extra={"event": "run_exists", "run": name, "path": destination},
+        )
         return
 
     try:
-        LOGGER.info(f"Syncing run '{source.name}' to '{destination}'...")
-        # NOTE: shutil.copytree is not used here because it invokes shutil.copystat at the end,
-        # which can cause issues with file permissions and timestamps on some systems.
-        run(["cp", "-r", str(source), str(destination)], check=True)
-    except CalledProcessError as exc:
-        LOGGER.error(f"Unable to copy run '{source.name}': {exc}")
+        LOGGER.info(
+            "Syncing run '%s' to '%s'...",
+            name,
+            destination,
+            extra={"event": "sync_started", "run": name, "path": destination},
+        )
+        copied = _copy_tree(source, destination)
+    except OSError as exc:
+        LOGGER.error("Unable to copy run '%s': %s", name, exc, extra={"event": "copy_failed", "run": name})
         return
+    except CalledProcessError as exc:
+        if exc.returncode == RSYNC_VANISHED_SOURCE:
+            LOGGER.warning(
+                "Some files vanished from run '%s' while it was being copied.",
+                name,
+                extra={"event": "files_vanished", "run": name},
+            )
+            copied = None
+        elif exc.returncode == RSYNC_PARTIAL_TRANSFER:
+            LOGGER.error(
+                "Run '%s' was only partially copied: %s", name, exc, extra={"event": "copy_partial", "run": name}
+            )
+            return
+        else:
+            LOGGER.error("Unable to copy run '%s': %s", name, exc, extra={"event": "copy_failed", "run": name})
+            return
 
-    if CONFIG.verify and (_ssize := _dir_size(source)) != (_dsize := _dir_size(destination)):
-        LOGGER.warning(f"Size mismatch for run '{source.name}': source size {_ssize}, destination size {_dsize}.")
-        return
+    if CONFIG.verify:
+        try:
+            # Reuse the source totals from the copy when there are any, so the source is not walked a second time.
+            _sstats, _dstats = copied or _dir_stats(source), _dir_stats(destination)
+        except OSError as exc:
+            # E.g. the whole source vanished during the copy, which rsync only reports as vanished files.
+            LOGGER.error("Unable to verify run '%s': %s", name, exc, extra={"event": "verify_failed", "run": name})
+            return
+        if _sstats != _dstats:
+            LOGGER.warning(
+                "Size mismatch for run '%s': source has %d files (%d bytes), destination has %d files (%d bytes).",
+                name,
+                *_sstats,
+                *_dstats,
+                extra={"event": "size_mismatch", "run": name},
+            )
+            return
 
-    LOGGER.info(f"Run '{source.name}' synced successfully.")
+    LOGGER.info("Run '%s' synced successfully.", name, extra={"event": "run_synced", "run": name, "path": destination})
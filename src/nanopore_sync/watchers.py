@@ -1,6 +1,8 @@
 import asyncio as aio
-from pathlib import Path
-import re
+from concurrent.futures import Executor, ThreadPoolExecutor
+import logging
+import os
+from weakref import WeakSet
 
 from watchdog.events import (
     EVENT_TYPE_CLOSED,
@@ -21,23 +23,70 @@ from watchdog.events import (
     FileMovedEvent,
     FileOpenedEvent,
     FileSystemEvent,
+    FileSystemEventHandler,
     RegexMatchingEventHandler,
 )
-from watchdog.observers import Observer, ObserverType
+from watchdog.observers import ObserverType
+# Use inotify directly; watchdog's Observer silently falls back to polling the whole tree when inotify is unavailable.
+from watchdog.observers.inotify import InotifyObserver
 
 from .config import CONFIG
 from .logging import LOGGER
 from .sync import sync_run
 
+EVENT_HANDLERS = tuple(
+    f"on_{event_type}"
+    for event_type in (
+        "any_event",
+        EVENT_TYPE_MODIFIED,
+        EVENT_TYPE_MOVED,
+        EVENT_TYPE_CREATED,
+        EVENT_TYPE_DELETED,
+        EVENT_TYPE_CLOSED,
+        EVENT_TYPE_CLOSED_NO_WRITE,
+        EVENT_TYPE_OPENED,
+    )
+)
+
 
 class AsyncEventHandler(RegexMatchingEventHandler):
     """
     An asyncio-compatible event handler for filesystem events.
+    Events are queued onto the loop and handled in order by a single consumer task,
+    rather than spawning a task per event.
     """
 
+    batch_size = 128
+
     def __init__(self, *args, loop: aio.BaseEventLoop, **kwargs):
         self._loop = loop
+        self._queue: aio.Queue = aio.Queue()
         super().__init__(*args, **kwargs)
+        # Shadow the coroutine handlers with thread-safe wrappers once, so watchdog's dispatch finds them directly.
+        for name in EVENT_HANDLERS:
+            setattr(self, name, self._wrap(getattr(self, name)))
+        self._consumer = self._loop.create_task(self._consume())
+
+    async def _consume(self):
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            for item in batch:
+                if item is None:
+                    return
+                method, event = item
+                try:
+                    await method(event)
+                except Exception:
+                    # A single consumer handles every event, so one failure must not stop the others.
+                    LOGGER.exception("Failed to handle '%s' for '%s'", event.__class__.__name__, event.src_path)
+
+    def stop(self):
+        """
+        Stop the consumer once the events queued so far have been handled. Must be called on the loop.
+        """
+        self._queue.put_nowait(None)
 
     async def on_any_event(self, event: FileSystemEvent): ...
     async def on_moved(self, event: FileMovedEvent | DirMovedEvent): ...
@@ -48,25 +97,8 @@ class AsyncEventHandler(RegexMatchingEventHandler):
     async def on_closed_no_write(self, event: FileClosedNoWriteEvent): ...
     async def on_opened(self, event: FileOpenedEvent): ...
 
-    def __getattribute__(self, name):
-        if name in (
-            f"on_{event_type}"
-            for event_type in (
-                "any_event",
-                EVENT_TYPE_MODIFIED,
-                EVENT_TYPE_MOVED,
-                EVENT_TYPE_CREATED,
-                EVENT_TYPE_DELETED,
-                EVENT_TYPE_CLOSED,
-                EVENT_TYPE_CLOSED_NO_WRITE,
-                EVENT_TYPE_OPENED,
-            )
-        ):
-            method = object.__getattribute__(self, name)
-            return lambda event: self._loop.call_soon_threadsafe(
-                self._loop.create_task, method(event)
-            )
-        return super().__getattribute__(name)
+    def _wrap(self, method):
+        return lambda event: self._loop.call_soon_threadsafe(self._queue.put_nowait, (method, event))
 
 
 class NanoporeRunEventHandler(AsyncEventHandler):
@@ -74,111 +106,165 @@ class NanoporeRunEventHandler(AsyncEventHandler):
     Detects new run directories and starts a per-run completion watcher.
     """
 
-    def __init__(self, *args, **kwargs):
-        _regexes = [f".*/{CONFIG.run_name_pattern}$"]
-        super().__init__(*args, regexes=_regexes, **kwargs)
+    def __init__(self, *args, semaphore: aio.Semaphore, executor: Executor, **kwargs):
+        self._semaphore = semaphore
+        self._executor = executor
+        # Observers of runs still being watched; finished ones drop out once they are garbage collected.
+        self.watchers: WeakSet[ObserverType] = WeakSet()
+        # The pattern is already compiled (case-insensitively), so watchdog must not compile it again.
+        super().__init__(*args, regexes=[CONFIG.run_path_re], case_sensitive=True, **kwargs)
 
     async def on_created(self, event: DirCreatedEvent):
-        watch_run_completion(event.src_path)
-        LOGGER.info(f"Detected new run directory: {event.src_path}")
+        self.watchers.add(watch_run_completion(event.src_path, semaphore=self._semaphore, executor=self._executor))
+        LOGGER.info(
+            "Detected new run directory: %s",
+            event.src_path,
+            extra={"event": "run_detected", "run": os.path.basename(event.src_path), "path": event.src_path},
+        )
 
 
 class NanoporeCompletionEventHandler(AsyncEventHandler):
     """
     Detects completion of a run by noticing final_summary*.txt arriving/closing.
-    Robust to: create, close, close-no-write, in-place rename, or cross-dir moves.
-    Also includes a tiny poller as a safety net.
+    Robust to: create, close, in-place rename, or cross-dir moves.
+    Also scans the run dir once on start, in case the signal arrived before the watch did.
     """
 
-    def __init__(self, *args, observer: ObserverType, path: str, **kwargs):
-        # Allow all events through; we filter by regex ourselves to avoid dropping unpaired moves.
-        _regexes = [r".*"]
-        self._sig_re = re.compile(CONFIG.completion_signal_pattern)
+    def __init__(
+        self,
+        *args,
+        observer: ObserverType,
+        path: str,
+        semaphore: aio.Semaphore,
+        executor: Executor,
+        **kwargs,
+    ):
+        self._sig_re = CONFIG.completion_signal_re
         self._done = False
-        self.path = Path(path)
+        self.path = path
         self._observer = observer
-        super().__init__(*args, regexes=_regexes, **kwargs)
-        self._loop.create_task(self._poll_for_final_summary())
-
-    async def _poll_for_final_summary(self, interval: float = 2.0):
-        while not self._done:
-            for p in self.path.glob("final_summary*.txt"):
-                if self._sig_re.search(str(p)):
-                    await self._do_sync(str(p))
-                    return
-            await aio.sleep(interval)
+        self._semaphore = semaphore
+        self._executor = executor
+        # No regexes for watchdog to compile per run; dispatch below doesn't use them.
+        super().__init__(*args, regexes=[], **kwargs)
+        # Keep a reference, or the loop only holds the task weakly and a failure would never be retrieved.
+        self._scan = self._loop.create_task(self._scan_for_final_summary())
+        self._scan.add_done_callback(self._scan_done)
+
+    def dispatch(self, event: FileSystemEvent):
+        # Allow all events through; we filter by regex ourselves to avoid dropping unpaired moves.
+        FileSystemEventHandler.dispatch(self, event)
+
+    async def _scan_for_final_summary(self):
+        # inotify only reports what happens after the watch is added, so look once for a signal that beat it.
+        try:
+            with os.scandir(self.path) as entries:
+                matched = next((e.path for e in entries if e.is_file() and self._is_signal(e.path)), None)
+        except FileNotFoundError:
+            return
+        if matched:
+            await self._do_sync(matched)
+
+    def _scan_done(self, task: aio.Task):
+        if not task.cancelled() and (exc := task.exception()) is not None:
+            # Same as a failing event in the consumer, see AsyncEventHandler._consume.
+            LOGGER.error("Failed to scan '%s' for a completion signal", self.path, exc_info=exc)
+
+    def _is_signal(self, path: str) -> bool:
+        # Once the run is being synced every further event is moot, so don't bother running the regex.
+        return not self._done and self._sig_re.search(path) is not None
 
     async def _do_sync(self, matched_path: str):
         if self._done:
             return
         self._done = True
-        LOGGER.info(f"Detected completed run: {matched_path}")
+        LOGGER.info(
+            "Detected completed run: %s",
+            matched_path,
+            extra={"event": "run_completed", "run": os.path.basename(self.path), "path": matched_path},
+        )
         self._observer.stop()
         await self._loop.run_in_executor(None, self._observer.join)
-        await self._loop.run_in_executor(None, sync_run, self.path)
+        try:
+            # Runs finishing close together would otherwise fight over the same destination disk.
+            async with self._semaphore:
+                await self._loop.run_in_executor(self._executor, sync_run, self.path)
+        finally:
+            self.stop()
 
     async def on_created(self, event: FileCreatedEvent):
-        if self._sig_re.search(event.src_path):
+        if self._is_signal(event.src_path):
             await self._do_sync(event.src_path)
 
     async def on_closed(self, event: FileClosedEvent):
-        if self._sig_re.search(event.src_path):
-            await self._do_sync(event.src_path)
-
-    async def on_closed_no_write(self, event: FileClosedNoWriteEvent):
-        if self._sig_re.search(event.src_path):
+        if self._is_signal(event.src_path):
             await self._do_sync(event.src_path)
 
     async def on_moved(self, event: FileMovedEvent):
-        dest = getattr(event, "dest_path", "") or ""
-        if (dest and self._sig_re.search(dest)) or self._sig_re.search(event.src_path):
-            await self._do_sync(dest if dest and self._sig_re.search(dest) else event.src_path)
+        for path in (getattr(event, "dest_path", "") or "", event.src_path):
+            if path and self._is_signal(path):
+                await self._do_sync(path)
+                return
 
     async def on_any_event(self, event):
-        dest = getattr(event, "dest_path", None)
-        LOGGER.debug(f"Detected '{event.__class__.__name__}' src='{event.src_path}' dest='{dest}'")
+        # Called for every event, so don't even gather the arguments unless they will be logged.
+        if LOGGER.isEnabledFor(logging.DEBUG):
+            dest = getattr(event, "dest_path", None)
+            LOGGER.debug("Detected '%s' src='%s' dest='%s'", event.__class__.__name__, event.src_path, dest)
 
 
-def watch_new_runs():
+async def watch_new_runs():
     """
-    Watch the source tree for new run directories.
+    Watch the source tree for new run directories, until cancelled.
     """
-    observer = Observer()
-    loop = aio.new_event_loop()
-    handler = NanoporeRunEventHandler(loop=loop)
+    observer = InotifyObserver()
+    loop = aio.get_running_loop()
+    semaphore = aio.Semaphore(CONFIG.max_parallel_syncs)
+    executor = ThreadPoolExecutor(max_workers=CONFIG.max_parallel_syncs, thread_name_prefix="sync")
+    handler = NanoporeRunEventHandler(loop=loop, semaphore=semaphore, executor=executor)
     observer.schedule(handler, path=CONFIG.source, event_filter=[DirCreatedEvent], recursive=True)
-    LOGGER.info(f"[discovery] watching '{CONFIG.source}' recursively for new runs")
     try:
         observer.start()
-        loop.run_until_complete(loop.run_in_executor(None, observer.join))
-    except KeyboardInterrupt:
-        observer.stop()
-        observer.join()
+        LOGGER.info(
+            "[discovery] watching '%s' recursively for new runs",
+            CONFIG.source,
+            extra={"event": "discovery_started", "path": CONFIG.source},
+        )
+        await loop.run_in_executor(None, observer.join)
     finally:
-        loop.close()
+        for watcher in (observer, *handler.watchers):
+            watcher.stop()
+        handler.stop()
+        executor.shutdown(wait=False, cancel_futures=True)
 
 
-def watch_run_completion(path: str):
+def watch_run_completion(path: str, *, semaphore: aio.Semaphore, executor: Executor) -> ObserverType:
     """
     Watch a single run directory for completion (final_summary*.txt).
+    The sync itself runs on the given executor, once the semaphore allows it.
+    Returns the observer, which stops itself once the run is complete.
     """
-    observer = Observer()
+    observer = InotifyObserver()
     loop = aio.get_running_loop()
     handler = NanoporeCompletionEventHandler(
         loop=loop,
         observer=observer,
         path=path,
+        semaphore=semaphore,
+        executor=executor,
     )
     # Listen for all plausible completion signals; some backends will emit only a subset.
+    # Read-only closes are left out: they fire for every read of every file in an active run, and a signal
+    # that already existed is caught by the handler's initial scan.
     observer.schedule(
         handler,
         path=path,
-        event_filter=[FileCreatedEvent, FileClosedEvent, FileClosedNoWriteEvent, FileMovedEvent],
+        event_filter=[FileCreatedEvent, FileClosedEvent, FileMovedEvent],
     )
-    LOGGER.info(f"[completion] watching run dir '{path}' (non-recursive)")
-    try:
-        observer.start()
-        loop.call_soon_threadsafe(loop.run_in_executor, None, observer.join)
-    except KeyboardInterrupt:
-        observer.stop()
-        observer.join()
+    observer.start()
+    LOGGER.info(
+        "[completion] watching run dir '%s' (non-recursive)",
+        path,
+        extra={"event": "completion_watch_started", "run": os.path.basename(path), "path": path},
+    )
+    return observer
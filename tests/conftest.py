@@ -0,0 +1,13 @@
+"""
+Shared pytest configuration for the nanopore sync tests.
+Puts temporary directories on tmpfs when it is available, so that setting up runs and syncing them happens in memory.
+"""
+
+import os
+
+TMPFS = "/dev/shm"
+
+# pytest still creates its usual numbered, owner-checked pytest-of-<user> directories, and cleans up old ones,
+# just below tmpfs instead of the system temporary directory. An explicit --basetemp or environment setting wins.
+if os.path.isdir(TMPFS) and os.access(TMPFS, os.W_OK):
+    os.environ.setdefault("PYTEST_DEBUG_TEMPROOT", TMPFS)
@@ -0,0 +1,508 @@
+"""
+Tests for copying runs: sync_run's handling of copy outcomes and the copy helpers behind it.
+"""
+
+import errno
+import logging
+import os
+import shutil
+from subprocess import CalledProcessError, CompletedProcess
+
+from pytest import LogCaptureFixture, MonkeyPatch, fixture, mark, raises, skip
+
+from nanopore_sync import sync
+from nanopore_sync.config import CONFIG
+
+
+@fixture
+def destination(tmp_path, monkeypatch: MonkeyPatch) -> str:
+    """
+    Points the global configuration at an empty destination directory, with verification enabled
+    and the copy method picked automatically.
+
+    Args:
+        tmp_path (Path): Temporary directory provided by pytest.
+        monkeypatch (MonkeyPatch): Restores the configuration after the test.
+
+    Returns:
+        str: The destination directory.
+    """
+    os.mkdir(destination := os.path.join(tmp_path, "destination"))
+    monkeypatch.setattr(CONFIG, "destination", destination, raising=False)
+    monkeypatch.setattr(CONFIG, "verify", True, raising=False)
+    monkeypatch.setattr(CONFIG, "copy_method", "auto", raising=False)
+    return destination
+
+
+@fixture
+def run_dir(tmp_path) -> str:
+    """
+    Creates a small run directory to sync.
+
+    Args:
+        tmp_path (Path): Temporary directory provided by pytest.
+
+    Returns:
+        str: The run directory.
+    """
+    os.makedirs(os.path.join(run := os.path.join(tmp_path, "20231001_1200_run_a_12345678"), "c"))
+    for relpath, content in [("a.txt", b"SOME DATA"), ("c/d.txt", b"EVEN MORE DATA")]:
+        with open(os.path.join(run, relpath), "wb") as f:
+            f.write(content)
+    return run
+
+
+def events(caplog: LogCaptureFixture) -> list[str]:
+    """
+    Lists the structured events logged so far.
+
+    Args:
+        caplog (LogCaptureFixture): The captured log records.
+
+    Returns:
+        list[str]: The `event` field of every record that has one, in order.
+    """
+    return [record.event for record in caplog.records if hasattr(record, "event")]
+
+
+@mark.parametrize(
+    "returncode, expected",
+    [
+        # Files vanishing mid-copy is expected for live runs, so the copy still counts if it verifies.
+        (sync.RSYNC_VANISHED_SOURCE, ["sync_started", "files_vanished", "run_synced"]),
+        (sync.RSYNC_PARTIAL_TRANSFER, ["sync_started", "copy_partial"]),
+        (1, ["sync_started", "copy_failed"]),
+    ],
+)
+def test_sync_run_rsync_exit_codes(
+    run_dir: str,
+    destination: str,
+    returncode: int,
+    expected: list[str],
+    monkeypatch: MonkeyPatch,
+    caplog: LogCaptureFixture,
+) -> None:
+    """
+    Tests how sync_run reports the rsync exit codes it tells apart, after rsync has copied the run.
+
+    Args:
+        run_dir (str): The run to sync.
+        destination (str): The configured destination directory.
+        returncode (int): The exit code rsync fails with.
+        expected (list[str]): The events sync_run should log, in order.
+        monkeypatch (MonkeyPatch): Used to stand in for rsync.
+        caplog (LogCaptureFixture): The captured log records.
+
+    Returns:
+        None
+    """
+
+    def rsync(args, **kwargs):
+        # Permissions, times and ownership are left behind, so -a must not be used.
+        assert args[:2] == ["rsync", "-rlHS"]
+        shutil.copytree(run_dir, os.path.join(destination, os.path.basename(run_dir)))
+        raise CalledProcessError(returncode, args)
+
+    monkeypatch.setattr(sync, "_rsync_supported", lambda: True)
+    monkeypatch.setattr(sync, "run", rsync)
+    caplog.set_level(logging.INFO)
+
+    sync.sync_run(run_dir)
+
+    assert events(caplog) == expected
+
+
+def test_sync_run_source_vanished(
+    run_dir: str, destination: str, monkeypatch: MonkeyPatch, caplog: LogCaptureFixture
+) -> None:
+    """
+    Tests that a run whose source disappears during the copy is reported as failing verification, rather than raising.
+
+    Args:
+        run_dir (str): The run to sync.
+        destination (str): The configured destination directory.
+        monkeypatch (MonkeyPatch): Used to stand in for rsync.
+        caplog (LogCaptureFixture): The captured log records.
+
+    Returns:
+        None
+    """
+
+    def rsync(args, **kwargs):
+        shutil.rmtree(run_dir)
+        raise CalledProcessError(sync.RSYNC_VANISHED_SOURCE, args)
+
+    monkeypatch.setattr(sync, "_rsync_supported", lambda: True)
+    monkeypatch.setattr(sync, "run", rsync)
+    caplog.set_level(logging.INFO)
+
+    sync.sync_run(run_dir)
+
+    assert events(caplog) == ["sync_started", "files_vanished", "verify_failed"]
+
+
+RSYNC_STATS = """
+Number of files: {files} ({kinds})
+Number of created files: {files} ({kinds})
+Number of deleted files: 0
+Number of regular files transferred: {reg}
+Total file size: {size} bytes
+Total transferred file size: {size} bytes
+Literal data: {size} bytes
+Matched data: 0 bytes
+File list size: 0
+File list generation time: 0.001 seconds
+File list transfer time: 0.000 seconds
+Total bytes sent: 1,235,000
+Total bytes received: 92
+
+sent 1,235,000 bytes  received 92 bytes  2,470,184.00 bytes/sec
+total size is {size}  speedup is 1.00
+"""
+
+
+@mark.parametrize(
+    "stats, expected",
+    [
+        (RSYNC_STATS.format(files="1,236", kinds="reg: 1,234, dir: 2", reg="1,234", size="1,234,567"), (1234, 1234567)),
+        (RSYNC_STATS.format(files="1", kinds="dir: 1", reg="0", size="0"), (0, 0)),
+        # Symlinks add their length to the total size, so it can't be compared with what _dir_stats measures.
+        (RSYNC_STATS.format(files="5", kinds="reg: 3, dir: 1, link: 1", reg="3", size="42"), None),
+        ("", None),
+    ],
+    ids=["files", "empty", "symlinks", "missing"],
+)
+def test_parse_rsync_stats(stats: str, expected: tuple[int, int] | None) -> None:
+    """
+    Tests reading the number of regular files and their total size from rsync's statistics.
+
+    Args:
+        stats (str): The output of rsync.
+        expected (tuple[int, int] | None): The totals that should be read, None if they can't be used.
+
+    Returns:
+        None
+    """
+    assert sync._parse_rsync_stats(stats) == expected
+
+
+def test_sync_run_rsync_totals(
+    run_dir: str, destination: str, monkeypatch: MonkeyPatch, caplog: LogCaptureFixture
+) -> None:
+    """
+    Tests that verifying a run copied by rsync uses rsync's totals instead of walking the source again.
+
+    Args:
+        run_dir (str): The run to sync.
+        destination (str): The configured destination directory.
+        monkeypatch (MonkeyPatch): Used to stand in for rsync and to record which trees are measured.
+        caplog (LogCaptureFixture): The captured log records.
+
+    Returns:
+        None
+    """
+    files, size = sync._dir_stats(run_dir)
+
+    def rsync(args, **kwargs):
+        shutil.copytree(run_dir, os.path.join(destination, os.path.basename(run_dir)))
+        kinds = f"reg: {files}, dir: 2"
+        return CompletedProcess(args, 0, stdout=RSYNC_STATS.format(files=files + 2, kinds=kinds, reg=files, size=size))
+
+    measured = []
+    dir_stats = sync._dir_stats
+    monkeypatch.setattr(sync, "_dir_stats", lambda path: measured.append(path) or dir_stats(path))
+    monkeypatch.setattr(sync, "_rsync_supported", lambda: True)
+    monkeypatch.setattr(sync, "run", rsync)
+    caplog.set_level(logging.INFO)
+
+    sync.sync_run(run_dir)
+
+    assert events(caplog) == ["sync_started", "run_synced"]
+    assert measured == [os.path.join(destination, os.path.basename(run_dir))]
+
+
+@mark.parametrize(
+    "version, supported",
+    [
+        ("rsync  version 3.2.7  protocol version 31", True),
+        ("rsync  version 3.1.3  protocol version 31", True),
+        # As shipped with RHEL/CentOS 7 and Ubuntu 18.04, which reject -S together with --inplace.
+        ("rsync  version 3.1.2  protocol version 31", False),
+        ("rsync  version 3.0.9  protocol version 30", False),
+        ("openrsync: protocol version 29", False),
+        (None, False),
+    ],
+)
+def test_rsync_supported(version: str | None, supported: bool, monkeypatch: MonkeyPatch) -> None:
+    """
+    Tests that rsync is only used when it is installed and at least RSYNC_MIN_VERSION.
+
+    Args:
+        version (str | None): The first line of `rsync --version`, None if rsync is not installed.
+        supported (bool): Whether rsync should be used.
+        monkeypatch (MonkeyPatch): Used to stand in for rsync.
+
+    Returns:
+        None
+    """
+    monkeypatch.setattr(sync, "which", lambda cmd: version and f"/usr/bin/{cmd}")
+    monkeypatch.setattr(sync, "run", lambda args, **kwargs: CompletedProcess(args, 0, stdout=f"{version}\n"))
+
+    # Bypass the cache, which would otherwise keep the first answer for the whole session.
+    assert sync._rsync_supported.__wrapped__() is supported
+
+
+@mark.parametrize("method", ["cp", "python"])
+def test_sync_run_copy_method(
+    run_dir: str, destination: str, method: str, monkeypatch: MonkeyPatch, caplog: LogCaptureFixture
+) -> None:
+    """
+    Tests syncing a run with each copy method that doesn't need rsync, which isn't always installed.
+    The copy in Python counts the source while copying, so only the destination is measured to verify it.
+
+    Args:
+        run_dir (str): The run to sync.
+        destination (str): The configured destination directory.
+        method (str): The configured copy method.
+        monkeypatch (MonkeyPatch): Used to configure the copy method and to record which trees are measured.
+        caplog (LogCaptureFixture): The captured log records.
+
+    Returns:
+        None
+    """
+    measured = []
+    dir_stats = sync._dir_stats
+    monkeypatch.setattr(sync, "_dir_stats", lambda path: measured.append(path) or dir_stats(path))
+    monkeypatch.setattr(CONFIG, "copy_method", method)
+    caplog.set_level(logging.INFO)
+
+    sync.sync_run(run_dir)
+
+    assert events(caplog) == ["sync_started", "run_synced"]
+    copy = os.path.join(destination, os.path.basename(run_dir))
+    assert measured == ([run_dir, copy] if method == "cp" else [copy])
+    with open(os.path.join(copy, "c", "d.txt"), "rb") as f:
+        assert f.read() == b"EVEN MORE DATA"
+
+
+def test_parallel_copytree(run_dir: str, tmp_path) -> None:
+    """
+    Tests that the Python copy reproduces a tree with nested directories and symlinks,
+    and that the totals it returns are the ones verification would measure.
+
+    Args:
+        run_dir (str): The run to copy.
+        tmp_path (Path): Temporary directory provided by pytest.
+
+    Returns:
+        None
+    """
+    os.symlink("a.txt", os.path.join(run_dir, "link.txt"))
+    os.symlink("c", os.path.join(run_dir, "link_dir"))
+    os.symlink("missing", os.path.join(run_dir, "c", "dangling"))
+    copy = os.path.join(tmp_path, "copy")
+
+    assert sync._parallel_copytree(run_dir, copy) == sync._dir_stats(run_dir) == sync._dir_stats(copy)
+
+    for relpath, content in [("a.txt", b"SOME DATA"), ("c/d.txt", b"EVEN MORE DATA")]:
+        with open(os.path.join(copy, relpath), "rb") as f:
+            assert f.read() == content
+    # Symlinks are recreated as links with the same target, not followed.
+    for relpath, target in [("link.txt", "a.txt"), ("link_dir", "c"), ("c/dangling", "missing")]:
+        assert os.readlink(os.path.join(copy, relpath)) == target
+
+
+def test_parallel_copytree_error(run_dir: str, tmp_path, monkeypatch: MonkeyPatch) -> None:
+    """
+    Tests that a file failing to copy on a worker thread is raised to the caller.
+
+    Args:
+        run_dir (str): The run to copy.
+        tmp_path (Path): Temporary directory provided by pytest.
+        monkeypatch (MonkeyPatch): Used to make copying a single file fail.
+
+    Returns:
+        None
+    """
+    copy_file = sync._copy_file
+
+    def failing_copy(src: str, dst: str, stat: os.stat_result) -> None:
+        if src.endswith("d.txt"):
+            raise OSError(errno.EIO, "Input/output error", src)
+        copy_file(src, dst, stat)
+
+    monkeypatch.setattr(sync, "_copy_file", failing_copy)
+
+    with raises(OSError) as exc:
+        sync._parallel_copytree(run_dir, os.path.join(tmp_path, "copy"))
+    assert exc.value.errno == errno.EIO
+
+
+@mark.parametrize(
+    "size, helper",
+    [
+        (sync.SMALL_FILE_SIZE - 1, None),
+        (sync.SMALL_FILE_SIZE, "copyfileobj"),
+        (sync.LARGE_FILE_SIZE - 1, "copyfileobj"),
+        (sync.LARGE_FILE_SIZE, "_fast_copy"),
+    ],
+)
+def test_copy_file_size_tiers(size: int, helper: str | None, tmp_path, monkeypatch: MonkeyPatch) -> None:
+    """
+    Tests that files on either side of each size threshold are copied intact, by the expected strategy.
+
+    Args:
+        size (int): The size of the file to copy.
+        helper (str | None): The sync module function the copy should go through, None for a single read.
+        tmp_path (Path): Temporary directory provided by pytest.
+        monkeypatch (MonkeyPatch): Used to record which copy functions are called.
+
+    Returns:
+        None
+    """
+    calls = []
+
+    def spy(name: str):
+        function = getattr(sync, name)
+
+        def record(*args, **kwargs):
+            calls.append(name)
+            return function(*args, **kwargs)
+
+        return record
+
+    for name in ("copyfileobj", "_fast_copy"):
+        monkeypatch.setattr(sync, name, spy(name))
+    src, dst = os.path.join(tmp_path, "src"), os.path.join(tmp_path, "dst")
+    with open(src, "wb") as f:
+        f.write(data := os.urandom(size))
+
+    sync._copy_file(src, dst, os.stat(src))
+
+    assert calls == ([helper] if helper else [])
+    with open(dst, "rb") as f:
+        assert f.read() == data
+
+
+@mark.parametrize("after", [0, 1 << 20], ids=["immediately", "midway"])
+@mark.parametrize("error", [errno.EXDEV, errno.EINVAL, errno.EPERM], ids=errno.errorcode.get)
+def test_fast_copy_fallback(error: int, after: int, tmp_path, monkeypatch: MonkeyPatch) -> None:
+    """
+    Tests that a large file is still copied intact when copy_file_range refuses, right away or partway through,
+    with one of the errors that mean the kernel can't copy it, e.g. EINVAL on some FUSE and NFS mounts.
+
+    Args:
+        error (int): The errno copy_file_range fails with.
+        after (int): The number of bytes copy_file_range copies before failing.
+        tmp_path (Path): Temporary directory provided by pytest.
+        monkeypatch (MonkeyPatch): Used to make copy_file_range fail.
+
+    Returns:
+        None
+    """
+    copy_file_range = os.copy_file_range
+
+    def failing_copy_file_range(src: int, dst: int, count: int, *args) -> int:
+        if after and os.lseek(src, 0, os.SEEK_CUR) < after:
+            return copy_file_range(src, dst, after, *args)
+        raise OSError(error, os.strerror(error))
+
+    monkeypatch.setattr(os, "copy_file_range", failing_copy_file_range)
+    src, dst = os.path.join(tmp_path, "src"), os.path.join(tmp_path, "dst")
+    with open(src, "wb") as f:
+        f.write(data := os.urandom(sync.LARGE_FILE_SIZE))
+
+    sync._fast_copy(src, dst)
+
+    with open(dst, "rb") as f:
+        assert f.read() == data
+
+
+def test_fadvise(tmp_path, monkeypatch: MonkeyPatch) -> None:
+    """
+    Tests that access advice is passed to the kernel, and skipped where posix_fadvise is unavailable.
+
+    Args:
+        tmp_path (Path): Temporary directory provided by pytest.
+        monkeypatch (MonkeyPatch): Used to stand in for posix_fadvise.
+
+    Returns:
+        None
+    """
+    calls = []
+    monkeypatch.setattr(os, "posix_fadvise", lambda *args: calls.append(args), raising=False)
+    with open(os.path.join(tmp_path, "file"), "wb") as f:
+        sync._fadvise(f.fileno(), os.POSIX_FADV_DONTNEED)
+        assert calls == [(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)]
+
+        monkeypatch.setattr(sync, "HAS_POSIX_FADVISE", False)
+        sync._fadvise(f.fileno(), os.POSIX_FADV_DONTNEED)
+        assert len(calls) == 1
+
+
+def make_sparse(path: str, regions: list[int], size: int) -> None:
+    """
+    Creates a file of the given size that only has data in 4 KiB regions at the given offsets, and holes elsewhere.
+
+    Args:
+        path (str): The file to create.
+        regions (list[int]): The offsets of the data regions.
+        size (int): The size of the file.
+
+    Returns:
+        None
+    """
+    with open(path, "wb") as f:
+        for offset in regions:
+            f.seek(offset)
+            f.write(os.urandom(4 << 10))
+        f.truncate(size)
+
+
+@mark.parametrize("kernel_copy", [True, False], ids=["copy_file_range", "pwrite"])
+@mark.parametrize("copy", ["_copy_sparse", "_copy_file"])
+@mark.parametrize(
+    "regions, size",
+    [
+        ([0, 8 << 20], (8 << 20) + (4 << 10)),
+        ([1 << 20], 16 << 20),
+        ([], 0),
+    ],
+    ids=["holes", "trailing_hole", "empty"],
+)
+def test_copy_sparse(
+    regions: list[int], size: int, copy: str, kernel_copy: bool, tmp_path, monkeypatch: MonkeyPatch
+) -> None:
+    """
+    Tests that sparse files are copied with the same content, without filling in their holes.
+
+    Args:
+        regions (list[int]): The offsets of the source file's data regions.
+        size (int): The size of the source file.
+        copy (str): The sync module function to copy with.
+        kernel_copy (bool): Whether copy_file_range works, or fails as it does across some filesystems.
+        tmp_path (Path): Temporary directory provided by pytest.
+        monkeypatch (MonkeyPatch): Used to make copy_file_range fail.
+
+    Returns:
+        None
+    """
+    src, dst = os.path.join(tmp_path, "src"), os.path.join(tmp_path, "dst")
+    make_sparse(src, regions, size)
+    stat = os.stat(src)
+    if size and stat.st_blocks * 512 >= size:
+        skip("The filesystem of the temporary directory does not support sparse files")
+    if not kernel_copy:
+
+        def copy_file_range(*args):
+            raise OSError(errno.EXDEV, "Invalid cross-device link")
+
+        monkeypatch.setattr(os, "copy_file_range", copy_file_range)
+
+    getattr(sync, copy)(src, dst, *((size,) if copy == "_copy_sparse" else (stat,)))
+
+    with open(src, "rb") as fsrc, open(dst, "rb") as fdst:
+        assert fsrc.read() == fdst.read()
+    assert os.stat(dst).st_size == size
+    # Holes stay holes, so the copy takes up no more space than the source.
+    assert os.stat(dst).st_blocks <= stat.st_blocks
@@ -0,0 +1,70 @@
+"""
+Tests for the application's log output formats.
+"""
+
+from io import StringIO
+import json
+import logging
+
+from pytest import fixture
+
+from nanopore_sync.logging import HANDLER, LOGGER, set_log_format
+
+
+@fixture
+def output():
+    """
+    Sends the application's log handler to a buffer, attached to the application's logger.
+    Under pytest the root logger is already configured, so the handler is otherwise not attached to anything.
+
+    Yields:
+        StringIO: The log output.
+    """
+    stream = HANDLER.setStream(buffer := StringIO())
+    level = LOGGER.level
+    LOGGER.addHandler(HANDLER)
+    LOGGER.setLevel(logging.INFO)
+    try:
+        yield buffer
+    finally:
+        LOGGER.setLevel(level)
+        LOGGER.removeHandler(HANDLER)
+        HANDLER.setStream(stream)
+        set_log_format("text")
+
+
+def test_json_log_format(output: StringIO) -> None:
+    """
+    Tests that the JSON format writes one object per line with the structured fields, and that text restores lines.
+    Handlers that don't belong to the application, like pytest's own, must keep their format.
+
+    Args:
+        output (StringIO): The log output.
+
+    Returns:
+        None
+    """
+    formatters = {handler: handler.formatter for handler in logging.getLogger().handlers}
+
+    set_log_format("json")
+    LOGGER.info("Run '%s' synced successfully.", "run_a", extra={"event": "run_synced", "run": "run_a", "path": "/x"})
+    try:
+        raise OSError("disk on fire")
+    except OSError:
+        LOGGER.exception("Unable to copy run '%s'", "run_a")
+    set_log_format("text")
+    LOGGER.warning("Back to text")
+
+    synced, failed, text = output.getvalue().splitlines()
+    assert (record := json.loads(synced)).pop("time")
+    assert record == {
+        "level": "INFO",
+        "message": "Run 'run_a' synced successfully.",
+        "event": "run_synced",
+        "run": "run_a",
+        "path": "/x",
+    }
+    assert json.loads(failed)["level"] == "ERROR"
+    assert "OSError: disk on fire" in json.loads(failed)["exception"]
+    assert text.endswith(" - WARNING - Back to text")
+    assert {handler: handler.formatter for handler in logging.getLogger().handlers} == formatters
@@ -1,64 +1,200 @@
 import asyncio as aio
+from collections import defaultdict
 from contextlib import suppress
+import json
+import logging
+import os
 from pathlib import Path
+from uuid import uuid4
 
-from pytest import mark
+from pytest import FixtureRequest, MonkeyPatch, TempPathFactory, fixture, mark
+from pytest_asyncio import fixture as async_fixture
 
+from nanopore_sync import sync
+from nanopore_sync.cli import run
+from nanopore_sync.config import CONFIG
+from nanopore_sync.logging import LOGGER, JsonFormatter
 
-@mark.asyncio
-async def test_sync(tmp_path: Path) -> None:
+
+class LogBuffer(logging.Handler):
+    """
+    Collects log records as the structured objects JsonFormatter turns them into, as with `--log-format json`,
+    so tests can wait for and assert on specific fields rather than matching message text.
+    Records can be emitted from any thread; they are handed over to the event loop.
+    Records are indexed by their event and run as they arrive, so lookups don't rescan everything collected.
     """
-    Tests the end-to-end synchronization of a nanopore run directory using the CLI.
-    Verifies that all expected files and directories are copied and that the success log message is present.
+
+    def __init__(self, loop: aio.AbstractEventLoop):
+        super().__init__()
+        self.setFormatter(JsonFormatter())
+        self.records: list[dict] = []
+        self._index: dict[tuple[str | None, str | None], list[dict]] = defaultdict(list)
+        self._loop = loop
+        self._changed = aio.Event()
+
+    def __str__(self) -> str:
+        return "\n".join(map(json.dumps, self.records))
+
+    def find(self, **fields: str) -> dict | None:
+        """
+        Finds the first collected record with all of the given fields.
+        Only the records with the requested event and run are checked, when both are given.
+
+        Args:
+            **fields (str): The field values the record must have, e.g. `event="run_synced"`.
+
+        Returns:
+            dict | None: The matching record, or None if there is none.
+        """
+        if "event" in fields and "run" in fields:
+            candidates = self._index.get((fields["event"], fields["run"]), ())
+        else:
+            candidates = self.records
+        return next((record for record in candidates if fields.items() <= record.items()), None)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self._loop.call_soon_threadsafe(self._append, self.formatter.to_dict(record))
+
+    def _append(self, record: dict) -> None:
+        self.records.append(record)
+        self._index[record.get("event"), record.get("run")].append(record)
+        self._changed.set()
+
+    async def wait_for(self, timeout: float = 5.0, **fields: str) -> dict:
+        """
+        Waits until a record with all of the given fields has been collected.
+
+        Args:
+            timeout (float): Seconds to wait before failing.
+            **fields (str): The field values the record must have, see `find`.
+
+        Returns:
+            dict: The matching record.
+        """
+
+        async def _wait() -> dict:
+            while (record := self.find(**fields)) is None:
+                self._changed.clear()
+                await self._changed.wait()
+            return record
+
+        try:
+            return await aio.wait_for(_wait(), timeout)
+        except TimeoutError:
+            raise AssertionError(f"Timed out waiting for a record with {fields}:\n{self}") from None
+
+
+def populate(root: str, spec: list[tuple[str, bytes]]) -> None:
+    """
+    Creates a tree of files below a root directory, using plain os calls on precomputed string paths.
 
     Args:
-        tmp_path (Path): Temporary directory provided by pytest for test isolation.
+        root (str): The directory to create the files in; it is created if missing.
+        spec (list[tuple[str, bytes]]): The files to create, as paths relative to the root and their contents.
 
     Returns:
         None
     """
-    (input := (tmp_path / "input")).mkdir()
-    (output := (tmp_path / "output")).mkdir()
-
-    cmdline = [
-        *("python", "-m", "nanopore_sync"),
-        *("--source", str(input)),
-        *("--destination", str(output)),
-        "--verify",
-    ]
-    proc = await aio.subprocess.create_subprocess_exec(
-        *cmdline,
-        stdout=aio.subprocess.PIPE,
-        stderr=aio.subprocess.PIPE,
-    )
-
-    await aio.sleep(0.5)
-    (input / "20231001_1200_run_a_12345678").mkdir()
-    await aio.sleep(0.1)
-    (input / "20231001_1200_run_a_12345678" / "a.txt").write_text("SOME DATA")
-    (input / "20231001_1200_run_a_12345678" / "b.txt").write_text("SOME MORE DATA")
-    (input / "20231001_1200_run_a_12345678" / "c").mkdir()
-    (input / "20231001_1200_run_a_12345678" / "c" / "d.txt").write_text("EVEN MORE DATA")
-    await aio.sleep(0.1)
-    (input / "20231001_1200_run_a_12345678" / "final_summary.txt").touch()
-    await aio.sleep(0.1)
-
-    with suppress(ProcessLookupError):
-        proc.terminate()
-    await proc.wait()
-    _, stderr = await proc.communicate()
-    logs = stderr.decode("utf-8")
+    for directory in {os.path.join(root, os.path.dirname(relpath)) for relpath, _ in spec}:
+        os.makedirs(directory, exist_ok=True)
+    for relpath, content in spec:
+        fd = os.open(os.path.join(root, relpath), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.write(fd, content)
+        finally:
+            os.close(fd)
+
+
+@async_fixture(scope="session", loop_scope="session", params=["--verify", "--no-verify"])
+async def nanopore_sync(request: FixtureRequest, tmp_path_factory: TempPathFactory):
+    """
+    Runs the application in-process for the whole test session, collecting its log records.
+    Waits until the watcher is ready, and cancels it again once all tests are done.
+    Parametrized over the verification flag, so every test runs both with and without verification.
+
+    Args:
+        request (FixtureRequest): The fixture request, holding the verification flag to pass.
+        tmp_path_factory (TempPathFactory): Factory for temporary directories provided by pytest.
+
+    Yields:
+        tuple[Path, Path, LogBuffer, bool]: The watched source and destination directories, the collected logs,
+            and whether runs are verified.
+    """
+    source = tmp_path_factory.mktemp("source")
+    destination = tmp_path_factory.mktemp("destination")
+
+    LOGGER.addHandler(logs := LogBuffer(aio.get_running_loop()))
+    task = run(["--source", str(source), "--destination", str(destination), request.param])
+    await logs.wait_for(event="discovery_started", path=str(source))
+
+    yield source, destination, logs, request.param == "--verify"
+
+    task.cancel()
+    with suppress(aio.CancelledError):
+        await task
+    LOGGER.removeHandler(logs)
+
+
+@fixture
+def run_name() -> str:
+    """
+    Generates a run name that is unique within the session, so tests sharing the running application
+    can tell their log records and synced runs apart.
+
+    Returns:
+        str: A run name matching the default run name pattern.
+    """
+    return f"20231001_1200_run_a_{uuid4().hex[:8]}"
+
+
+@mark.asyncio(loop_scope="session")
+async def test_sync(nanopore_sync, run_name: str, tmp_path: Path, monkeypatch: MonkeyPatch) -> None:
+    """
+    Tests the end-to-end synchronization of a nanopore run directory.
+    Verifies that all expected files and directories are copied and that the success log record is present.
+
+    Args:
+        nanopore_sync: The running application, see the fixture of the same name.
+        run_name (str): A unique name for the run.
+        tmp_path (Path): Temporary directory provided by pytest, used to stage the run outside the watched source.
+        monkeypatch (MonkeyPatch): Used to record the trees measured to verify the run.
+
+    Returns:
+        None
+    """
+    source, output, logs, verify = nanopore_sync
+    measured = []
+    dir_stats = sync._dir_stats
+    monkeypatch.setattr(sync, "_dir_stats", lambda path: measured.append(path) or dir_stats(path))
+    # Each test gets its own directory in the watched source, which runs are discovered in recursively.
+    os.mkdir(input := os.path.join(source, uuid4().hex))
+    # The paths used below are built once, as strings, which is also how the log records carry them.
+    run = os.path.join(input, run_name)
+    out_run = os.path.join(output, run_name)
+
+    # Build the run outside the watched tree and move it in as a whole, which arrives as a single event.
+    staging = os.path.join(tmp_path, run_name)
+    populate(staging, [("a.txt", b"SOME DATA"), ("b.txt", b"SOME MORE DATA"), ("c/d.txt", b"EVEN MORE DATA")])
+    os.rename(staging, run)
+    await logs.wait_for(event="completion_watch_started", run=run_name, path=run)
+
+    # The completion signal is written in place, as the sequencer does, to exercise the completion watcher.
+    populate(run, [("final_summary.txt", b"")])
+    await logs.wait_for(event="run_synced", run=run_name)
 
     # Verify that the expected run directory was detected
-    assert f"Detected new run directory: {input / '20231001_1200_run_a_12345678'}" in logs
+    assert logs.find(event="run_detected", run=run_name, path=run)
 
     # Verify that subdirectories are not detected as new runs
-    assert f"Detected new run directory: {input / '20231001_1200_run_a_12345678' / 'c'}" not in logs
+    assert not logs.find(event="run_detected", run="c", path=os.path.join(run, "c"))
+
+    # Verify that the run was only verified, by measuring the copy, when the application was told to
+    assert CONFIG.verify is verify
+    assert (out_run in measured) is verify
 
     # Verify that the run was synced successfully
-    assert "Run '20231001_1200_run_a_12345678' synced successfully." in logs
-    assert "Size missmatch for run '20231001_1200_run_a_12345678'" not in logs
-    assert (output / "20231001_1200_run_a_12345678").exists()
-    for path in ["a.txt", "b.txt", "c/d.txt"]:
-        assert (output / "20231001_1200_run_a_12345678" / path).exists()
-    assert (output / "20231001_1200_run_a_12345678" / "final_summary.txt").exists()
+    assert logs.find(event="run_synced", run=run_name, path=out_run)
+    assert not logs.find(event="size_mismatch", run=run_name)
+    assert os.path.isdir(out_run)
+    for path in ["a.txt", "b.txt", "c/d.txt", "final_summary.txt"]:
+        assert os.path.exists(os.path.join(out_run, path))
@@ -0,0 +1,116 @@
+"""
+Tests for the completion watchers' behaviour outside of the filesystem event stream:
+failures of the initial scan, and how many runs are synced at once.
+"""
+
+import asyncio as aio
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import os
+import re
+import threading
+import time
+
+from pytest import LogCaptureFixture, MonkeyPatch, mark
+
+from nanopore_sync import watchers
+from nanopore_sync.config import CONFIG
+
+
+class StoppedObserver:
+    """
+    Stands in for the observer of a completion watch that was never started.
+    """
+
+    def stop(self) -> None: ...
+
+    def join(self) -> None: ...
+
+
+@mark.asyncio
+async def test_initial_scan_failure_is_logged(tmp_path, monkeypatch: MonkeyPatch, caplog: LogCaptureFixture) -> None:
+    """
+    Tests that a sync started by the initial scan for a completion signal, which fails, is logged.
+
+    Args:
+        tmp_path (Path): Temporary directory provided by pytest, holding an already completed run.
+        monkeypatch (MonkeyPatch): Used to make syncing the run fail.
+        caplog (LogCaptureFixture): The captured log records.
+
+    Returns:
+        None
+    """
+
+    def failing_sync_run(source: str) -> None:
+        raise OSError("disk on fire")
+
+    monkeypatch.setattr(CONFIG, "completion_signal_re", re.compile(r"final_summary.*\.txt$"), raising=False)
+    monkeypatch.setattr(watchers, "sync_run", failing_sync_run)
+    open(os.path.join(tmp_path, "final_summary.txt"), "w").close()
+
+    with ThreadPoolExecutor(1) as executor:
+        handler = watchers.NanoporeCompletionEventHandler(
+            observer=StoppedObserver(),
+            path=str(tmp_path),
+            semaphore=aio.Semaphore(),
+            executor=executor,
+            loop=aio.get_running_loop(),
+        )
+        await aio.wait([handler._scan, handler._consumer], timeout=5)
+
+    # The done callback runs on the next turn of the loop.
+    await aio.sleep(0)
+    [record] = [record for record in caplog.records if record.levelno == logging.ERROR]
+    assert record.getMessage() == f"Failed to scan '{tmp_path}' for a completion signal"
+    assert isinstance(record.exc_info[1], OSError)
+
+
+@mark.asyncio
+@mark.parametrize("max_parallel_syncs", [1, 2])
+async def test_max_parallel_syncs(max_parallel_syncs: int, tmp_path, monkeypatch: MonkeyPatch) -> None:
+    """
+    Tests that completed runs sharing a semaphore never sync more at once than the configured maximum.
+    The executor has a thread for every run, so the semaphore is all that holds them back.
+
+    Args:
+        max_parallel_syncs (int): The maximum number of runs to sync at the same time.
+        tmp_path (Path): Temporary directory provided by pytest, holding the completed runs.
+        monkeypatch (MonkeyPatch): Used to stand in for syncing a run.
+
+    Returns:
+        None
+    """
+    lock, active, peak = threading.Lock(), 0, 0
+
+    def slow_sync_run(source: str) -> None:
+        nonlocal active, peak
+        with lock:
+            active += 1
+            peak = max(peak, active)
+        time.sleep(0.05)
+        with lock:
+            active -= 1
+
+    monkeypatch.setattr(CONFIG, "completion_signal_re", re.compile(r"final_summary.*\.txt$"), raising=False)
+    monkeypatch.setattr(watchers, "sync_run", slow_sync_run)
+    runs = [os.path.join(tmp_path, f"run_{i}") for i in range(3)]
+    for run in runs:
+        os.mkdir(run)
+        open(os.path.join(run, "final_summary.txt"), "w").close()
+
+    semaphore = aio.Semaphore(max_parallel_syncs)
+    with ThreadPoolExecutor(len(runs)) as executor:
+        handlers = [
+            watchers.NanoporeCompletionEventHandler(
+                observer=StoppedObserver(),
+                path=run,
+                semaphore=semaphore,
+                executor=executor,
+                loop=aio.get_running_loop(),
+            )
+            for run in runs
+        ]
+        await aio.wait([handler._consumer for handler in handlers], timeout=5)
+
+    assert all(handler._consumer.done() for handler in handlers)
+    assert peak == max_parallel_syncs